@@ -3,11 +3,11 @@ Main Lambda handler for Wind-Damage Photo Aggregator
 Handles HTTP requests, validates input, orchestrates analysis pipeline
 """
 
-import json
 import uuid
 from datetime import datetime, timezone
 from typing import Dict, Any, List
 import asyncio
+import orjson
 from models.damage_detector_gemini import DamageDetector
 from models.quality import QualityAnalyzer
 from models.dedup import Deduplicator
@@ -16,12 +16,29 @@ from utils.logging import setup_logging
 from utils.aggregation import DamageAggregator, SeverityCalculator, DataGapAnalyzer, ConfidenceCalculator
 from schemas import (
     AggregateRequest, AggregateResponse, ErrorResponse, SourceImages, LogContext,
-    ProcessingResult, validate_image_url
+    ProcessingResult, IMAGE_URL_PATTERN
 )
 
 # Setup logging
 logger = setup_logging()
 
+# Pipeline components are created once per container and reused by every
+# warm invocation
+_FETCHER = ImageFetcher()
+_QUALITY = QualityAnalyzer()
+_DEDUP = Deduplicator()
+_DETECTOR = DamageDetector(debug=False)
+
+# Aggregation components
+_AGG = DamageAggregator()
+_SEV = SeverityCalculator()
+_GAPS = DataGapAnalyzer()
+_CONF = ConfidenceCalculator()
+
+# Event loop shared across invocations
+_LOOP = asyncio.new_event_loop()
+asyncio.set_event_loop(_LOOP)
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for processing wind damage photo aggregation requests
@@ -33,7 +50,6 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Returns:
         Dict containing aggregated damage analysis results
     """
-    loop = asyncio.get_event_loop()
     correlation_id = str(uuid.uuid4())
     log_context = LogContext(correlation_id=correlation_id)
     logger.info("Processing request", extra={"correlation_id": correlation_id})
@@ -42,7 +58,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Handle both direct Lambda invocation and API Gateway events
         if 'body' in event:
             # API Gateway event
-            body = json.loads(event.get('body', '{}'))
+            body = orjson.loads(event.get('body', '{}'))
         else:
             # Direct Lambda invocation
             body = event
@@ -56,29 +72,17 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return error_response(422, str(e), correlation_id)
         
         # Validate image URLs
-        invalid_urls = [url for url in request.images if not validate_image_url(url)]
+        invalid_urls = [url for url in request.images if not IMAGE_URL_PATTERN.match(url)]
         if invalid_urls:
             return error_response(422, f"Invalid image URLs: {invalid_urls[:3]}", correlation_id)
             
-        # Initialize components
-        fetcher = ImageFetcher()
-        quality_analyzer = QualityAnalyzer()
-        deduplicator = Deduplicator()
-        damage_detector = DamageDetector(debug=True)
-        
-        # Initialize aggregation components
-        damage_aggregator = DamageAggregator()
-        severity_calculator = SeverityCalculator()
-        data_gap_analyzer = DataGapAnalyzer()
-        confidence_calculator = ConfidenceCalculator()
-        
         # Process images
-        results = loop.run_until_complete(process_images(
+        results = _LOOP.run_until_complete(process_images(
             images=request.images,
-            fetcher=fetcher,
-            quality_analyzer=quality_analyzer,
-            deduplicator=deduplicator,
-            damage_detector=damage_detector,
+            fetcher=_FETCHER,
+            quality_analyzer=_QUALITY,
+            deduplicator=_DEDUP,
+            damage_detector=_DETECTOR,
             correlation_id=correlation_id
         ))
         
@@ -86,10 +90,10 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         response = generate_response(
             claim_id=request.claim_id,
             results=results,
-            damage_aggregator=damage_aggregator,
-            severity_calculator=severity_calculator,
-            data_gap_analyzer=data_gap_analyzer,
-            confidence_calculator=confidence_calculator,
+            damage_aggregator=_AGG,
+            severity_calculator=_SEV,
+            data_gap_analyzer=_GAPS,
+            confidence_calculator=_CONF,
             correlation_id=correlation_id
         )
 
@@ -99,7 +103,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
-            'body': response.model_dump()
+            'body': response.model_dump_json()
         }
 
     except Exception as e:
@@ -128,12 +132,26 @@ async def process_images(images: List[str],
     Returns:
         ProcessingResult containing analysis results
     """
-    # Download images
-    downloaded_images = await fetcher.fetch_images(images, correlation_id)
+    downloaded_count = 0
+    
+    async def downloaded_images():
+        """Stream completed downloads, dropping failed ones before any decoding happens"""
+        nonlocal downloaded_count
+        async for path, data in fetcher.fetch_images(images, correlation_id):
+            if data:
+                downloaded_count += 1
+                yield path, data
     
-    # Analyze quality and filter
-    quality_results = await quality_analyzer.analyze_batch(downloaded_images)
-    high_quality_images = [img for img, score in quality_results if score > 0.3]
+    # Analyze quality while downloads are still in flight, keeping only acceptable images
+    high_quality_images = [
+        img async for img, score in quality_analyzer.analyze_batch(downloaded_images())
+        if score > 0.3
+    ]
+    failed_downloads = len(images) - downloaded_count
+    
+    # Restore request order, since downloads complete in arbitrary order
+    url_order = {url: i for i, url in enumerate(images)}
+    high_quality_images.sort(key=lambda img: url_order[img[0]])
     
     # Deduplicate
     unique_images = deduplicator.deduplicate(high_quality_images)
@@ -141,21 +159,22 @@ async def process_images(images: List[str],
     # Detect damage
     damage_results = await damage_detector.analyze_batch(unique_images)
 
+    # Split successful and failed analyses in a single pass
+    successful_results = []
     error_results = []
     for result in damage_results:
-        if result.error:
-            error_results.append(result)
+        (error_results if result.error else successful_results).append(result)
 
     if error_results:
         logger.error(f"Error results: {error_results}", extra={"correlation_id": correlation_id})
 
-    damage_results = [result for result in damage_results if not result.error]
-
+    damage_results = successful_results
     
     return ProcessingResult(
         total_images=len(images),
         analyzed_images=len(high_quality_images),
-        discarded_low_quality=len(images) - len(high_quality_images),
+        discarded_low_quality=downloaded_count - len(high_quality_images),
+        failed_downloads=failed_downloads,
         clusters=len(unique_images),
         damage_results=damage_results
     )
@@ -193,6 +212,7 @@ def generate_response(claim_id: str, results: ProcessingResult,
         total=results.total_images,
         analyzed=results.analyzed_images,
         discarded_low_quality=results.discarded_low_quality,
+        failed_downloads=results.failed_downloads,
         clusters=results.clusters
     )
     
@@ -219,5 +239,5 @@ def error_response(status_code: int, message: str, correlation_id: str) -> Dict[
     return {
         'statusCode': status_code,
         'headers': {'Content-Type': 'application/json'},
-        'body': error_response.model_dump()
+        'body': error_response.model_dump_json()
     } 
\ No newline at end of file
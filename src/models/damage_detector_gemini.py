@@ -1,24 +1,20 @@
 import os
+import base64
 import logging
 from langchain_google_genai import ChatGoogleGenerativeAI
-from typing import List, Literal, Tuple
+from typing import Any, ClassVar, Dict, List, Literal, Tuple
 from pydantic import BaseModel, Field, field_validator
 from schemas import DamageAnalysis, DamageArea, DamageSeverity, DamageIndicator
 import traceback
 import asyncio
 
 
-class DamageIndicatorOutput(BaseModel):
-    type: Literal['damage', 'broken', 'cracked', 'torn', 'missing', 'debris', 'destruction', 'wreckage', 'ruins'] = Field(..., description="Damage type")
-    confidence: float = Field(..., description="Confidence score")
-    severity_weight: int = Field(..., description="Severity weight")
-
 class DamageAnalysisGeminiOutput(BaseModel):
     has_damage: bool = Field(..., description="Whether damage was detected")
     location: Literal['roof', 'attic', 'siding', 'garage', 'windows', 'gutters', 'unknown'] = Field(..., description="Damage area")
     severity: int = Field(..., description="Damage severity")
     confidence: float = Field(..., description="Analysis confidence")
-    damage_indicators: List[DamageIndicatorOutput] = Field(default_factory=list, description="List of damage indicators")
+    damage_indicators: List[DamageIndicator] = Field(default_factory=list, description="List of damage indicators")
     notes: str = Field(..., description="Notes about the analysis. E.g: 'Shingle uplift along ridge'")
 
     @field_validator('severity')
@@ -29,117 +25,24 @@ class DamageAnalysisGeminiOutput(BaseModel):
 
 logger = logging.getLogger(__name__)
 
+def _sniff_mime_type(image_bytes: bytes) -> str:
+    """Detect the image MIME type from its magic bytes (defaults to JPEG)"""
+    if image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_bytes[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'image/jpeg'
+
 class DamageDetector:
     """
     Uses Google Gemini Vision API to detect and classify wind damage in images.
     Provides location classification and severity scoring.
     """
     
-    def __init__(self, debug: bool = False):
-        # Initialize Gemini API
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-        
-        model = ChatGoogleGenerativeAI(model='gemini-2.5-flash', temperature=0.0, api_key=api_key)
-        self.chain = model.with_structured_output(DamageAnalysisGeminiOutput)
-        self.debug = debug
-
-    async def analyze_batch(self, images: List[Tuple[str, bytes]], batch_size: int = 2) -> List[DamageAnalysis]:
-        """
-        Analyze a batch of images for damage detection using asyncio and batching.
-
-        Args:
-            images: List of (image_path, image_bytes) tuples
-            batch_size: Number of images to process concurrently in a batch
-
-        Returns:
-            List of damage analysis results
-        """
-        semaphore = asyncio.Semaphore(batch_size)
-
-        async def analyze_one(image_path, image_bytes):
-            try:
-                # Run the sync analyze_single_image in a thread to avoid blocking
-                async with semaphore:
-                    loop = asyncio.get_running_loop()
-                    result = await loop.run_in_executor(
-                        None, self.analyze_single_image, image_path, image_bytes
-                    )
-                    if self.debug:
-                        logger.info(f"Damage analysis result: {result}")
-                    return result
-            except Exception as e:
-                logger.error(f"Error analyzing image {image_path}: {str(e)}")
-                return DamageAnalysis(
-                    image_path=image_path,
-                    has_damage=False,
-                    area=DamageArea.UNKNOWN,
-                    severity=DamageSeverity.NONE,
-                    quality_score=0.0,
-                    confidence=0.0,
-                    damage_indicators=[],
-                    error=str(e)
-                )
-
-        tasks = [analyze_one(image_path, image_bytes) for image_path, image_bytes in images]
-        results = await asyncio.gather(*tasks)
-        return results
-
-    def analyze_single_image(self, image_path: str, image_bytes: bytes) -> DamageAnalysis:
-        """
-        Classify wind damage in an image using Gemini Vision API.
-        
-        Args:
-            image_path: Path of the image
-            image_bytes: Image bytes data
-            
-        Returns:
-            Dict containing damage classification results
-        """
-        try:
-            # Prepare prompt for Gemini
-            prompt = self._create_analysis_prompt()
-            
-            # Analyze with Gemini
-            response = self._analyze_with_gemini(image_url=image_path, prompt=prompt)
-
-            damage_analysis = DamageAnalysis(
-                image_path=image_path,
-                has_damage=response.has_damage,
-                area=DamageArea(response.location),
-                severity=DamageSeverity(response.severity),
-                quality_score=0.0,
-                confidence=response.confidence,
-                damage_indicators=[
-                    DamageIndicator(
-                        type=indicator.type,
-                        confidence=indicator.confidence,
-                        severity_weight=indicator.severity_weight
-                    )
-                    for indicator in response.damage_indicators
-                ],
-                error=None,
-                notes=response.notes
-            )
-            return damage_analysis
-            
-        except Exception as e:
-            logger.error(f"Error analyzing image {image_path}: {str(e)}")
-            return DamageAnalysis(
-                image_path=image_path,
-                has_damage=False,
-                area=DamageArea.UNKNOWN,
-                severity=DamageSeverity.NONE,
-                quality_score=0.0,
-                confidence=0.0,
-                damage_indicators=[],
-                error=str(e)
-            )
-    
-    def _create_analysis_prompt(self) -> str:
-        """Create a detailed prompt for wind damage analysis."""
-        return """
+    # Detailed prompt for wind damage analysis, shared by every request
+    _ANALYSIS_PROMPT: ClassVar[str] = """
         You are an expert building inspector specializing in wind damage assessment. Analyze this image for wind-related damage to buildings and property structures.
 
         CRITICAL INSTRUCTIONS:
@@ -223,19 +126,114 @@ class DamageDetector:
 
         IMPORTANT: Return ONLY valid JSON. No explanations, no additional text.
         """
+
+    _SYSTEM_MESSAGE: ClassVar[Dict[str, Any]] = {
+        "role": "system",
+        "content": [
+            {
+                "type": "text",
+                "text": _ANALYSIS_PROMPT,
+            },
+        ],
+    }
     
-    def _analyze_with_gemini(self, image_url: str, prompt: str) -> DamageAnalysisGeminiOutput:
+    def __init__(self, debug: bool = False):
+        # Initialize Gemini API
+        api_key = os.environ.get('GEMINI_API_KEY')
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is required")
+        
+        model = ChatGoogleGenerativeAI(model='gemini-2.5-flash', temperature=0.0, api_key=api_key)
+        self.chain = model.with_structured_output(DamageAnalysisGeminiOutput)
+        self.debug = debug
+
+    async def analyze_batch(self, images: List[Tuple[str, bytes]], batch_size: int = 10) -> List[DamageAnalysis]:
+        """
+        Analyze a batch of images for damage detection using asyncio and batching.
+
+        Args:
+            images: List of (image_path, image_bytes) tuples
+            batch_size: Number of images to process concurrently in a batch
+
+        Returns:
+            List of damage analysis results
+        """
+        semaphore = asyncio.Semaphore(batch_size)
+
+        async def analyze_one(image_path, image_bytes):
+            try:
+                async with semaphore:
+                    result = await self.analyze_single_image(image_path, image_bytes)
+                    if self.debug:
+                        logger.info(f"Damage analysis result: {result}")
+                    return result
+            except Exception as e:
+                logger.error(f"Error analyzing image {image_path}: {str(e)}")
+                return DamageAnalysis(
+                    image_path=image_path,
+                    has_damage=False,
+                    area=DamageArea.UNKNOWN,
+                    severity=DamageSeverity.NONE,
+                    quality_score=0.0,
+                    confidence=0.0,
+                    damage_indicators=[],
+                    error=str(e)
+                )
+
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(analyze_one(image_path, image_bytes))
+                for image_path, image_bytes in images
+            ]
+        return [task.result() for task in tasks]
+
+    async def analyze_single_image(self, image_path: str, image_bytes: bytes) -> DamageAnalysis:
+        """
+        Classify wind damage in an image using Gemini Vision API.
+        
+        Args:
+            image_path: Path of the image
+            image_bytes: Image bytes data
+            
+        Returns:
+            Dict containing damage classification results
+        """
+        try:
+            # Analyze with Gemini
+            response = await self._analyze_with_gemini(image_bytes=image_bytes)
+
+            damage_analysis = DamageAnalysis(
+                image_path=image_path,
+                has_damage=response.has_damage,
+                area=DamageArea(response.location),
+                severity=DamageSeverity(response.severity),
+                quality_score=0.0,
+                confidence=response.confidence,
+                damage_indicators=response.damage_indicators,
+                error=None,
+                notes=response.notes
+            )
+            return damage_analysis
+            
+        except Exception as e:
+            logger.error(f"Error analyzing image {image_path}: {str(e)}")
+            return DamageAnalysis(
+                image_path=image_path,
+                has_damage=False,
+                area=DamageArea.UNKNOWN,
+                severity=DamageSeverity.NONE,
+                quality_score=0.0,
+                confidence=0.0,
+                damage_indicators=[],
+                error=str(e)
+            )
+    
+    async def _analyze_with_gemini(self, image_bytes: bytes) -> DamageAnalysisGeminiOutput:
         """Send image and prompt to Gemini Vision API."""
         try:
-            system_message = {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt,
-                    },
-                ],
-            }
+            # Inline the already-downloaded bytes so Gemini doesn't re-fetch the URL
+            encoded = base64.b64encode(image_bytes).decode('ascii')
+            data_uri = f"data:{_sniff_mime_type(image_bytes)};base64,{encoded}"
             user_message = {
                 "role": "user",
                 "content": [
@@ -245,11 +243,11 @@ class DamageDetector:
                     },
                     {
                         "type": "image_url",
-                        "image_url": image_url,
+                        "image_url": data_uri,
                     },
                 ],
             }
-            response = self.chain.invoke([system_message, user_message])
+            response = await self.chain.ainvoke([self._SYSTEM_MESSAGE, user_message])
             print(response)
             if response:
                 return response
@@ -3,11 +3,16 @@ Image deduplication using perceptual hashing
 Identifies visually similar images and keeps the highest quality one
 """
 
+import hashlib
 import logging
-from typing import List, Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from PIL import Image
 import io
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 
 from schemas import (
     DeduplicationResult, 
@@ -16,6 +21,48 @@ from schemas import (
 
 logger = logging.getLogger(__name__)
 
+# Number of set bits in every possible byte value
+_POPCOUNT8 = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def _dct_basis(size: int, hash_size: int) -> np.ndarray:
+    """
+    Build the low-frequency rows of an orthonormal DCT-II basis
+    
+    Args:
+        size: Side of the square input image
+        hash_size: Number of low-frequency rows to keep
+        
+    Returns:
+        (hash_size, size) basis matrix
+    """
+    k = np.arange(hash_size)[:, None]
+    i = np.arange(size)[None, :]
+    scale = np.where(k == 0, np.sqrt(1.0 / size), np.sqrt(2.0 / size))
+    return scale * np.cos(np.pi * k * (2 * i + 1) / (2 * size))
+
+def _phash_batch(batch: np.ndarray, hash_size: int) -> np.ndarray:
+    """
+    Compute DCT perceptual hashes for a stack of square grayscale images
+    
+    Args:
+        batch: (N, size, size) uint8 grayscale tensor
+        hash_size: Side of the low-frequency block kept (hash_size^2 bits)
+        
+    Returns:
+        Array of N packed uint64 hashes
+    """
+    basis = _dct_basis(batch.shape[1], hash_size)
+    
+    # DCT along columns, then rows, for every image at once: basis @ pixels @ basis.T
+    low_freq = (basis @ batch @ basis.T).reshape(batch.shape[0], -1)
+    
+    # Threshold against the median, excluding the DC term
+    median = np.median(low_freq[:, 1:], axis=1, keepdims=True)
+    
+    # Pack bits MSB-first
+    shifts = np.arange(low_freq.shape[1] - 1, -1, -1, dtype=np.uint64)
+    return ((low_freq > median).astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64)
+
 class Deduplicator:
     """
     Deduplicates images using perceptual hashing
@@ -25,6 +72,14 @@ class Deduplicator:
         """Initialize deduplicator with similarity threshold"""
         self.similarity_threshold = 0.9  # Images with similarity > 0.9 are considered duplicates
         self.hash_size = 8  # Size of perceptual hash (8x8 = 64 bits)
+        self.dct_size = 32  # Size of the grayscale image fed to the DCT
+        self.hash_cache_size = 1024  # Max cached (hash, quality) entries
+        
+        # (hash, quality_score) keyed by image content digest, in LRU order
+        self._hash_cache: OrderedDict[bytes, Tuple[int, float]] = OrderedDict()
+        
+        # PIL releases the GIL while decoding, so decodes run in parallel
+        self._pool = ThreadPoolExecutor(max_workers=4)
     
     def deduplicate(self, images: List[ImageTuple]) -> List[ImageTuple]:
         """
@@ -40,20 +95,7 @@ class Deduplicator:
             return images
         
         # Calculate perceptual hashes for all images
-        image_hashes = []
-        for image_path, image_bytes in images:
-            try:
-                phash = self._calculate_perceptual_hash(image_bytes)
-                quality_score = self._calculate_quality_score(image_bytes)
-                image_hashes.append({
-                    'path': image_path,
-                    'bytes': image_bytes,
-                    'hash': phash,
-                    'quality_score': quality_score
-                })
-            except Exception as e:
-                logger.warning(f"Error calculating hash for {image_path}: {str(e)}")
-                continue
+        image_hashes = self._hash_images(images)
         
         # Group similar images
         clusters = self._cluster_similar_images(image_hashes)
@@ -69,134 +111,181 @@ class Deduplicator:
         logger.info(f"Deduplication: {len(images)} -> {len(unique_images)} images")
         return unique_images
     
-    def _calculate_perceptual_hash(self, image_bytes: bytes) -> str:
+    def _hash_images(self, images: List[ImageTuple]) -> List[Dict]:
         """
-        Calculate perceptual hash of an image
+        Decode every image once and hash the whole batch in a single pass
         
         Args:
-            image_bytes: Image data as bytes
+            images: List of (image_path, image_bytes) tuples
             
         Returns:
-            Perceptual hash string
+            List of image hash dictionaries (undecodable images are skipped)
         """
-        try:
-            # Open image
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to grayscale
-            image = image.convert('L')
-            
-            # Resize to hash_size x hash_size
-            image = image.resize((self.hash_size, self.hash_size))
-            
-            # Convert to numpy array
-            pixels = np.array(image)
-            
-            # Calculate mean pixel value
-            mean_pixel = np.mean(pixels)
-            
-            # Create hash: 1 if pixel > mean, 0 otherwise
-            hash_bits = pixels > mean_pixel
+        image_hashes = []
+        # Images still to hash, grouped by content digest so repeats decode once
+        pending: Dict[bytes, List[Dict]] = {}
+        for image_path, image_bytes in images:
+            entry = {'path': image_path, 'bytes': image_bytes}
+            key = hashlib.blake2b(image_bytes, digest_size=16).digest()
             
-            # Convert to string
-            hash_string = ''.join(['1' if bit else '0' for bit in hash_bits.flatten()])
+            cached = self._hash_cache.get(key)
+            if cached is not None:
+                self._hash_cache.move_to_end(key)
+                entry['hash'], entry['quality_score'] = cached
+            else:
+                pending.setdefault(key, []).append(entry)
+            image_hashes.append(entry)
+        
+        if pending:
+            # Decode one copy of each new image on the thread pool
+            first_entries = [entries[0] for entries in pending.values()]
+            decoded = self._pool.map(
+                self._try_decode_thumbnail,
+                [entry['path'] for entry in first_entries],
+                [entry['bytes'] for entry in first_entries]
+            )
             
-            return hash_string
+            thumbnails = []
+            hashed: List[Tuple[bytes, List[Dict]]] = []
+            for (key, entries), result in zip(pending.items(), decoded):
+                if result is None:
+                    continue
+                pixels, (width, height) = result
+                quality_score = self._calculate_quality_score(width, height)
+                for entry in entries:
+                    entry['quality_score'] = quality_score
+                thumbnails.append(pixels)
+                hashed.append((key, entries))
             
-        except Exception as e:
-            logger.error(f"Error calculating perceptual hash: {str(e)}")
-            # Return a default hash
-            return '0' * (self.hash_size * self.hash_size)
+            if thumbnails:
+                # Hash the stacked (N, dct_size, dct_size) tensor in one kernel call
+                hashes = _phash_batch(np.stack(thumbnails), self.hash_size)
+                for (key, entries), phash in zip(hashed, hashes):
+                    phash = int(phash)
+                    for entry in entries:
+                        entry['hash'] = phash
+                    self._cache_hash(key, phash, entries[0]['quality_score'])
+        
+        # Images that failed to decode never received a hash
+        return [entry for entry in image_hashes if 'hash' in entry]
     
-    def _calculate_quality_score(self, image_bytes: bytes) -> float:
+    def _cache_hash(self, key: bytes, phash: int, quality_score: float) -> None:
         """
-        Calculate quality score for ranking images in clusters
+        Store a computed hash, evicting the least recently used entry when full
+        
+        Args:
+            key: Image content digest
+            phash: Perceptual hash
+            quality_score: Cluster-ranking quality score
+        """
+        self._hash_cache[key] = (phash, quality_score)
+        if len(self._hash_cache) > self.hash_cache_size:
+            self._hash_cache.popitem(last=False)
+    
+    def _try_decode_thumbnail(self, image_path: str,
+                              image_bytes: bytes) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+        """
+        Decode a thumbnail, logging and returning None if the image is unreadable
         
         Args:
+            image_path: Image path/URL, for logging
             image_bytes: Image data as bytes
             
         Returns:
-            Quality score between 0 and 1
+            Result of _decode_thumbnail, or None on failure
         """
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Simple quality metrics
-            width, height = image.size
-            
-            # Resolution score
-            resolution_score = min(1.0, (width * height) / (1920 * 1080))
-            
-            # Aspect ratio score
-            aspect_ratio = width / height
-            aspect_score = 1.0 if 0.5 <= aspect_ratio <= 2.0 else 0.5
-            
-            # Combine scores
-            quality_score = (resolution_score + aspect_score) / 2
-            
-            return max(0.0, min(1.0, quality_score))
-            
+            return self._decode_thumbnail(image_bytes)
         except Exception as e:
-            logger.warning(f"Error calculating quality score: {str(e)}")
-            return 0.5
+            logger.warning(f"Error calculating hash for {image_path}: {str(e)}")
+            return None
     
-    def _cluster_similar_images(self, image_hashes: List[Dict]) -> List[List[Dict]]:
+    def _decode_thumbnail(self, image_bytes: bytes) -> Tuple[np.ndarray, Tuple[int, int]]:
         """
-        Group images into clusters based on similarity
+        Decode an image into the grayscale thumbnail used for hashing
         
         Args:
-            image_hashes: List of image hash dictionaries
+            image_bytes: Image data as bytes
             
         Returns:
-            List of clusters (each cluster is a list of similar images)
+            Tuple of (dct_size x dct_size uint8 array, original (width, height))
         """
-        clusters = []
-        processed = set()
-        
-        for i, img1 in enumerate(image_hashes):
-            if i in processed:
-                continue
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            # Dimensions come from the header; no pixel data is decoded yet
+            size = image.size
             
-            # Start new cluster
-            cluster = [img1]
-            processed.add(i)
+            # Let the JPEG decoder scale down (1/2 .. 1/8) and emit grayscale
+            # directly instead of decoding the full-resolution colour image
+            image.draft('L', (self.dct_size, self.dct_size))
             
-            # Find similar images
-            for j, img2 in enumerate(image_hashes[i+1:], i+1):
-                if j in processed:
-                    continue
-                
-                similarity = self._calculate_similarity(img1['hash'], img2['hash'])
-                if similarity >= self.similarity_threshold:
-                    cluster.append(img2)
-                    processed.add(j)
+            # Grayscale dct_size x dct_size pixels for the DCT
+            thumbnail = image.convert('L').resize((self.dct_size, self.dct_size))
+        
+        return np.asarray(thumbnail, dtype=np.uint8), size
+    
+    def _calculate_quality_score(self, width: int, height: int) -> float:
+        """
+        Calculate quality score for ranking images in clusters
+        
+        Args:
+            width: Image width in pixels
+            height: Image height in pixels
             
-            clusters.append(cluster)
+        Returns:
+            Quality score between 0 and 1
+        """
+        # Resolution score
+        resolution_score = min(1.0, (width * height) / (1920 * 1080))
         
-        return clusters
+        # Aspect ratio score
+        aspect_ratio = width / height
+        aspect_score = 1.0 if 0.5 <= aspect_ratio <= 2.0 else 0.5
+        
+        # Combine scores
+        quality_score = (resolution_score + aspect_score) / 2
+        
+        return max(0.0, min(1.0, quality_score))
     
-    def _calculate_similarity(self, hash1: str, hash2: str) -> float:
+    def _cluster_similar_images(self, image_hashes: List[Dict]) -> List[List[Dict]]:
         """
-        Calculate similarity between two perceptual hashes
+        Group images into clusters based on similarity
         
         Args:
-            hash1: First perceptual hash string
-            hash2: Second perceptual hash string
+            image_hashes: List of image hash dictionaries
             
         Returns:
-            Similarity score between 0 and 1
+            List of clusters (each cluster is a list of similar images)
         """
-        if len(hash1) != len(hash2):
-            return 0.0
+        if not image_hashes:
+            return []
+        
+        # Exact pass: identical hashes (d = 0) collapse in O(N)
+        buckets: Dict[int, List[Dict]] = {}
+        for image_hash in image_hashes:
+            buckets.setdefault(image_hash['hash'], []).append(image_hash)
+        
+        if len(buckets) == 1:
+            return list(buckets.values())
+        
+        # Fuzzy pass over one representative hash per bucket:
+        # XOR every pair, then count set bits byte by byte via a lookup table
+        n = len(buckets)
+        hashes = np.fromiter(buckets.keys(), dtype=np.uint64, count=n)
+        xor = hashes[:, None] ^ hashes[None, :]
+        hamming = _POPCOUNT8[xor.view(np.uint8)].reshape(n, n, 8).sum(axis=-1)
         
-        # Calculate Hamming distance
-        hamming_distance = sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
+        # Buckets within the allowed distance are linked; clusters are the connected components
+        max_distance = int((1.0 - self.similarity_threshold) * self.hash_size * self.hash_size)
+        # Only the strict upper triangle is needed: the graph is undirected and
+        # every bucket is trivially its own neighbour
+        adjacency = np.triu(hamming <= max_distance, k=1)
+        n_clusters, labels = connected_components(csr_matrix(adjacency), directed=False)
         
-        # Convert to similarity (0 = identical, 1 = completely different)
-        max_distance = len(hash1)
-        similarity = 1.0 - (hamming_distance / max_distance)
+        clusters: List[List[Dict]] = [[] for _ in range(n_clusters)]
+        for bucket, label in zip(buckets.values(), labels):
+            clusters[label].extend(bucket)
         
-        return similarity
+        return clusters
     
     def get_cluster_info(self, images: List[ImageTuple]) -> DeduplicationResult:
         """
@@ -217,28 +306,19 @@ class Deduplicator:
             )
         
         # Calculate hashes
-        image_hashes = []
-        for image_path, image_bytes in images:
-            try:
-                phash = self._calculate_perceptual_hash(image_bytes)
-                quality_score = self._calculate_quality_score(image_bytes)
-                image_hashes.append({
-                    'path': image_path,
-                    'bytes': image_bytes,
-                    'hash': phash,
-                    'quality_score': quality_score
-                })
-            except Exception as e:
-                logger.warning(f"Error in cluster info calculation: {str(e)}")
-                continue
+        image_hashes = self._hash_images(images)
         
         # Cluster images
         clusters = self._cluster_similar_images(image_hashes)
         
-        # Calculate statistics
+        # Calculate statistics; images that failed to decode are not duplicates
         total_images = len(images)
         num_clusters = len(clusters)
-        duplicates_removed = total_images - num_clusters
+        duplicates_removed = len(image_hashes) - num_clusters
+        
+        failed_images = total_images - len(image_hashes)
+        if failed_images:
+            logger.warning(f"Cluster info: {failed_images} of {total_images} images could not be decoded")
         
         return DeduplicationResult(
             total_images=total_images,
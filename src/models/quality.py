@@ -3,20 +3,106 @@ Image quality analysis for filtering blurry, dark, or unrelated images
 Uses Laplacian variance for blur detection and luminance analysis
 """
 
+import bisect
 import cv2
+import io
 import numpy as np
 import logging
-from typing import List, Tuple
+import struct
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, Tuple, Union
+from PIL import Image
 from schemas import ImageTuple
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# JPEG start-of-frame markers (SOF0-SOF15 minus DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers that stand alone without a length field (TEM, RSTn, SOI, EOI)
+_JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xDA)])
+
+def _peek_dimensions(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read width and height from a JPEG or PNG header without decoding pixels
+    
+    Args:
+        image_bytes: Image data as bytes
+        
+    Returns:
+        (width, height) tuple, or None for other formats or malformed headers
+    """
+    # PNG: the IHDR chunk always comes first
+    if image_bytes.startswith(b'\x89PNG\r\n\x1a\n') and len(image_bytes) >= 24:
+        return struct.unpack('>II', image_bytes[16:24])
+    
+    if not image_bytes.startswith(b'\xff\xd8'):
+        return None
+    
+    # JPEG: walk the marker segments up to the first start-of-frame
+    offset = 2
+    size = len(image_bytes)
+    while offset + 4 <= size:
+        if image_bytes[offset] != 0xFF:
+            return None
+        marker = image_bytes[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before the actual marker
+            offset += 1
+            continue
+        if marker in _JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+        
+        length = (image_bytes[offset + 2] << 8) | image_bytes[offset + 3]
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 9 > size:
+                return None
+            height, width = struct.unpack('>HH', image_bytes[offset + 5:offset + 9])
+            return width, height
+        
+        offset += 2 + length
+    
+    return None
+
+async def _chunked(images: Union[Iterable[ImageTuple], AsyncIterable[ImageTuple]],
+                   size: int) -> AsyncIterator[List[ImageTuple]]:
+    """
+    Group a sync or async iterable of images into lists of at most size items
+    
+    Args:
+        images: Iterable or async iterable of (image_path, image_bytes) tuples
+        size: Maximum chunk length
+        
+    Yields:
+        Lists of (image_path, image_bytes) tuples
+    """
+    chunk = []
+    if hasattr(images, '__aiter__'):
+        async for image in images:
+            chunk.append(image)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    else:
+        for image in images:
+            chunk.append(image)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    
+    if chunk:
+        yield chunk
+
 class QualityAnalyzer:
     """
     Analyzes image quality using various metrics
     """
     
+    # Lower bounds of each description band, and the label for every band
+    _QUALITY_THRESHOLDS = (0.2, 0.4, 0.6, 0.8)
+    _QUALITY_LABELS = ("unacceptable", "poor", "fair", "good", "excellent")
+    
     def __init__(self):
         """Initialize quality analyzer with thresholds"""
         # Quality thresholds
@@ -29,37 +115,58 @@ class QualityAnalyzer:
         self.min_height = 200
         self.max_width = 8000
         self.max_height = 8000
+        
+        # OpenCV parallelizes each operation internally; let it use its default thread count
+        cv2.setNumThreads(-1)
     
-    async def analyze_batch(self, images: List[ImageTuple], batch_size: int = 8) -> List[Tuple[ImageTuple, float]]:
+    async def analyze_batch(self, images: Union[Iterable[ImageTuple], AsyncIterable[ImageTuple]],
+                            batch_size: int = 10) -> AsyncIterator[Tuple[ImageTuple, float]]:
         """
-        Analyze quality for a batch of images asynchronously with batching.
+        Stream quality scores for images without blocking the event loop.
+        
+        Images are pulled from the (async) iterable in chunks of batch_size and
+        each chunk runs as one executor job; OpenCV parallelizes internally,
+        so per-image jobs add only overhead. Only one chunk is held at a time,
+        so the caller can drop rejected images early.
 
         Args:
-            images: List of (image_path, image_bytes) tuples
-            batch_size: Number of images to process concurrently
+            images: Iterable or async iterable of (image_path, image_bytes) tuples
+            batch_size: Number of images analyzed per executor job
 
+        Yields:
+            (image_tuple, quality_score) tuples in input order
+        """
+        loop = asyncio.get_running_loop()
+        async for chunk in _chunked(images, batch_size):
+            results = await loop.run_in_executor(None, self._analyze_images, chunk)
+            del chunk
+            for result in results:
+                yield result
+    
+    def _analyze_images(self, images: List[ImageTuple]) -> List[Tuple[ImageTuple, float]]:
+        """
+        Analyze quality for a batch of images
+        
+        Args:
+            images: List of (image_path, image_bytes) tuples
+            
         Returns:
             List of (image_tuple, quality_score) tuples
         """
-        semaphore = asyncio.Semaphore(batch_size)
-
-        async def analyze_one(image_tuple: ImageTuple) -> Tuple[ImageTuple, float]:
+        scores = [0.0] * len(images)
+        
+        for index, (_, image_bytes) in enumerate(images):
             try:
-                async with semaphore:
-                    loop = asyncio.get_running_loop()
-                    # Run the sync analyze_single_image in a thread pool
-                    quality_score = await loop.run_in_executor(
-                        None, self.analyze_single_image, image_tuple[1]
-                    )
-                    return (image_tuple, quality_score)
+                prepared = self._prepare_image(image_bytes)
+                if prepared is None:
+                    continue
+                
+                size_score, image = prepared
+                scores[index] = self._combine_scores(size_score, *self._image_stats(image))
             except Exception as e:
-                logger.warning(f"Error analyzing quality for image: {str(e)}")
-                # Assign low quality score for failed analysis
-                return (image_tuple, 0.1)
-
-        tasks = [analyze_one(image_tuple) for image_tuple in images]
-        results = await asyncio.gather(*tasks)
-        return results
+                logger.error(f"Error in quality analysis: {str(e)}")
+        
+        return list(zip(images, scores))
     
     def analyze_single_image(self, image_bytes: bytes) -> float:
         """
@@ -71,152 +178,171 @@ class QualityAnalyzer:
         Returns:
             Quality score between 0 and 1
         """
-        try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                return 0.0
-            
-            # Calculate quality metrics
-            blur_score = self._calculate_blur_score(image)
-            brightness_score = self._calculate_brightness_score(image)
-            contrast_score = self._calculate_contrast_score(image)
-            size_score = self._calculate_size_score(image)
+        [(_, quality_score)] = self._analyze_images([("", image_bytes)])
+        return quality_score
+    
+    def _image_stats(self, image: np.ndarray) -> Tuple[float, float, float]:
+        """
+        Brightness, contrast and Laplacian variance of a colour image
+        
+        Args:
+            image: BGR OpenCV image array
             
-            # Combine scores with weights
-            quality_score = (
-                blur_score * 0.4 +
-                brightness_score * 0.3 +
-                contrast_score * 0.2 +
-                size_score * 0.1
-            )
+        Returns:
+            (brightness, std, laplacian_var) tuple
+        """
+        # Brightness is the mean HSV value channel, i.e. the per-pixel max of B, G and R
+        blue, green, red = cv2.split(image)
+        brightness = cv2.mean(cv2.max(cv2.max(blue, green), red))[0]
+        
+        # Contrast is the standard deviation of the grayscale intensities
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, std = cv2.meanStdDev(gray)
+        
+        # A uniform frame has a zero Laplacian everywhere; skip the blur pass
+        if std.item() == 0.0:
+            return brightness, 0.0, 0.0
+        
+        # 4-neighbour Laplacian; for uint8 input its response fits in int16
+        _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S, ksize=1))
+        
+        return brightness, std.item(), laplacian_std.item() ** 2
+    
+    def _prepare_image(self, image_bytes: bytes) -> Optional[Tuple[float, np.ndarray]]:
+        """
+        Score the image size and decode the image
+        
+        Args:
+            image_bytes: Image data as bytes
             
-            return max(0.0, min(1.0, quality_score))
+        Returns:
+            (size_score, image) tuple with a BGR image, or None if the image is undersized or
+            cannot be decoded
+        """
+        # Read the dimensions from the header without decoding pixels
+        dimensions = _peek_dimensions(image_bytes)
+        if dimensions is None:
+            with Image.open(io.BytesIO(image_bytes)) as header:
+                dimensions = header.size
+        width, height = dimensions
+        
+        # Undersized images are rejected before any pixel is decoded
+        if width < self.min_width or height < self.min_height:
+            return None
+        
+        # Metrics run cheapest first: size needs only the header
+        size_score = self._calculate_size_score(width, height)
+        
+        # Decode in colour at full resolution: brightness needs every channel, and
+        # any downscaling averages away the fine detail the Laplacian blur metric
+        # (and its threshold) depend on. The metrics are invariant to EXIF
+        # rotations and flips, so orientation is ignored.
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        
+        if image is None:
+            return None
+        
+        return size_score, image
+    
+    def _combine_scores(self, size_score: float, brightness: float, std: float, laplacian_var: float) -> float:
+        """
+        Combine the raw image statistics into a weighted quality score
+        
+        Args:
+            size_score: Score from the original dimensions
+            brightness: Mean HSV value (max of B, G and R)
+            std: Standard deviation of the grayscale intensities
+            laplacian_var: Variance of the Laplacian response
             
-        except Exception as e:
-            logger.error(f"Error in quality analysis: {str(e)}")
-            return 0.0
+        Returns:
+            Quality score between 0 and 1
+        """
+        quality_score = (
+            self._calculate_blur_score(laplacian_var) * 0.4 +
+            self._calculate_brightness_score(brightness) * 0.3 +
+            self._calculate_contrast_score(std) * 0.2 +
+            size_score * 0.1
+        )
+        
+        return max(0.0, min(1.0, quality_score))
     
-    def _calculate_blur_score(self, image: np.ndarray) -> float:
+    def _calculate_blur_score(self, laplacian_var: float) -> float:
         """
         Calculate blur score using Laplacian variance
         
         Args:
-            image: OpenCV image array
+            laplacian_var: Variance of the Laplacian response
             
         Returns:
             Blur score between 0 and 1 (higher = less blurry)
         """
-        try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate Laplacian variance
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            
-            # Normalize to 0-1 scale
-            # Higher variance = less blurry
-            blur_score = min(1.0, laplacian_var / self.blur_threshold)
-            
-            return blur_score
-            
-        except Exception as e:
-            logger.warning(f"Error calculating blur score: {str(e)}")
-            return 0.5
+        # Normalize to 0-1 scale
+        # Higher variance = less blurry
+        blur_score = min(1.0, laplacian_var / self.blur_threshold)
+        
+        return blur_score
     
-    def _calculate_brightness_score(self, image: np.ndarray) -> float:
+    def _calculate_brightness_score(self, avg_brightness: float) -> float:
         """
         Calculate brightness score
         
         Args:
-            image: OpenCV image array
+            avg_brightness: Mean HSV value (max of B, G and R)
             
         Returns:
             Brightness score between 0 and 1
         """
-        try:
-            # Convert to HSV for better brightness analysis
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            v_channel = hsv[:, :, 2]
-            
-            # Calculate average brightness
-            avg_brightness = np.mean(v_channel)
-            
-            # Normalize to 0-1 scale
-            # Optimal brightness around 128 (middle of 0-255)
-            brightness_score = 1.0 - abs(avg_brightness - 128) / 128
-            
-            return max(0.0, min(1.0, brightness_score))
-            
-        except Exception as e:
-            logger.warning(f"Error calculating brightness score: {str(e)}")
-            return 0.5
+        # Normalize to 0-1 scale
+        # Optimal brightness around 128 (middle of 0-255)
+        brightness_score = 1.0 - abs(avg_brightness - 128) / 128
+        
+        return max(0.0, min(1.0, brightness_score))
     
-    def _calculate_contrast_score(self, image: np.ndarray) -> float:
+    def _calculate_contrast_score(self, contrast: float) -> float:
         """
         Calculate contrast score
         
         Args:
-            image: OpenCV image array
+            contrast: Standard deviation of the grayscale intensities
             
         Returns:
             Contrast score between 0 and 1
         """
-        try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate standard deviation as contrast measure
-            contrast = np.std(gray)
-            
-            # Normalize to 0-1 scale
-            # Higher contrast is better, but not too high
-            contrast_score = min(1.0, contrast / 50.0)
-            
-            return contrast_score
-            
-        except Exception as e:
-            logger.warning(f"Error calculating contrast score: {str(e)}")
-            return 0.5
+        # Normalize to 0-1 scale
+        # Higher contrast is better, but not too high
+        contrast_score = min(1.0, contrast / 50.0)
+        
+        return contrast_score
     
-    def _calculate_size_score(self, image: np.ndarray) -> float:
+    def _calculate_size_score(self, width: int, height: int) -> float:
         """
         Calculate size score based on image dimensions
         
+        Undersized images are rejected by _prepare_image before scoring.
+        
         Args:
-            image: OpenCV image array
+            width: Original image width
+            height: Original image height
             
         Returns:
             Size score between 0 and 1
         """
-        try:
-            height, width = image.shape[:2]
-            
-            # Check minimum size
-            if width < self.min_width or height < self.min_height:
-                return 0.0
-            
-            # Check maximum size
-            if width > self.max_width or height > self.max_height:
-                return 0.5  # Penalize very large images
-            
-            # Calculate area
-            area = width * height
-            
-            # Optimal area around 1MP (1024x1024)
-            optimal_area = 1024 * 1024
-            
-            # Score based on how close to optimal area
-            area_ratio = min(area / optimal_area, optimal_area / area)
-            size_score = area_ratio
-            
-            return max(0.0, min(1.0, size_score))
-            
-        except Exception as e:
-            logger.warning(f"Error calculating size score: {str(e)}")
-            return 0.5
+        # Check maximum size
+        if width > self.max_width or height > self.max_height:
+            return 0.5  # Penalize very large images
+        
+        # Calculate area
+        area = width * height
+        
+        # Optimal area around 1MP (1024x1024)
+        optimal_area = 1024 * 1024
+        
+        # Score based on how close to optimal area
+        area_ratio = min(area / optimal_area, optimal_area / area)
+        size_score = area_ratio
+        
+        return max(0.0, min(1.0, size_score))
     
     def is_acceptable_quality(self, quality_score: float) -> bool:
         """
@@ -240,13 +366,4 @@ class QualityAnalyzer:
         Returns:
             Quality description string
         """
-        if quality_score >= 0.8:
-            return "excellent"
-        elif quality_score >= 0.6:
-            return "good"
-        elif quality_score >= 0.4:
-            return "fair"
-        elif quality_score >= 0.2:
-            return "poor"
-        else:
-            return "unacceptable" 
\ No newline at end of file
+        return self._QUALITY_LABELS[bisect.bisect_right(self._QUALITY_THRESHOLDS, quality_score)]
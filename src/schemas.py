@@ -1,19 +1,22 @@
 """
 Type definitions for Wind-Damage Photo Aggregator
-Using Pydantic for validation and JSON serialization
+Using Pydantic for validation and JSON serialization at the API boundary,
+and slotted dataclasses for hot internal types
 """
 
-from typing import List, Dict, Optional, Tuple, Any
+import re
+from typing import Annotated, List, Dict, Optional, Tuple, Any
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from enum import Enum
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from enum import IntEnum, StrEnum
+from pydantic import BaseModel, Field, field_validator
 
 # Enums
-class LossType(str, Enum):
+class LossType(StrEnum):
     """Supported loss types"""
     WIND = "wind"
 
-class DamageArea(str, Enum):
+class DamageArea(StrEnum):
     """Supported damage areas"""
     ROOF = "roof"
     ATTIC = "attic"
@@ -23,7 +26,11 @@ class DamageArea(str, Enum):
     GUTTERS = "gutters"
     UNKNOWN = "unknown"
 
-class DamageSeverity(int, Enum):
+# Contiguous integer code for every damage area, for array-indexed aggregation
+DAMAGE_AREAS: Tuple[DamageArea, ...] = tuple(DamageArea)
+DAMAGE_AREA_CODES: Dict[DamageArea, int] = {area: code for code, area in enumerate(DAMAGE_AREAS)}
+
+class DamageSeverity(IntEnum):
     """Damage severity levels"""
     NONE = 0
     MINOR = 1
@@ -34,8 +41,6 @@ class DamageSeverity(int, Enum):
 # Request/Response Types
 class AggregateRequest(BaseModel):
     """Request payload for image aggregation"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     claim_id: str = Field(..., description="Claim identifier")
     loss_type: LossType = Field(..., description="Type of loss")
     images: List[str] = Field(..., description="List of image URLs")
@@ -67,25 +72,20 @@ class AggregateRequest(BaseModel):
 
 class ErrorResponse(BaseModel):
     """Error response structure"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     error: str = Field(..., description="Error message")
     correlation_id: str = Field(..., description="Request correlation ID")
     timestamp: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class SourceImages(BaseModel):
     """Source image statistics"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     total: int = Field(..., description="Total images received")
     analyzed: int = Field(..., description="Images analyzed")
     discarded_low_quality: int = Field(..., description="Images discarded due to quality")
+    failed_downloads: int = Field(0, description="Images that could not be downloaded")
     clusters: int = Field(..., description="Number of image clusters")
 
 class DamageAreaInfo(BaseModel):
     """Damage information for a specific area"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     area: DamageArea = Field(..., description="Damage area")
     damage_confirmed: bool = Field(..., description="Whether damage is confirmed")
     primary_peril: str = Field(..., description="Primary peril type")
@@ -96,8 +96,6 @@ class DamageAreaInfo(BaseModel):
 
 class AggregateResponse(BaseModel):
     """Response payload for image aggregation"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     claim_id: str = Field(..., description="Claim identifier")
     source_images: SourceImages = Field(..., description="Source image statistics")
     overall_damage_severity: float = Field(..., description="Overall damage severity")
@@ -108,27 +106,25 @@ class AggregateResponse(BaseModel):
     correlation_id: str = Field(..., description="Request correlation ID")
 
 # Image Processing Types
-class ImageData(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ImageData:
     """Image data with metadata"""
-    model_config = ConfigDict(use_enum_values=True)
-    
-    url: str = Field(..., description="Image URL")
-    image_bytes: bytes = Field(..., description="Image bytes")
-    size_bytes: int = Field(..., description="Image size in bytes")
-    content_type: str = Field(..., description="Content type")
+    url: str  # Image URL
+    image_bytes: bytes  # Image bytes
+    size_bytes: int  # Image size in bytes
+    content_type: str  # Content type
 
-class QualityScore(BaseModel):
+@dataclass(slots=True, frozen=True)
+class QualityScore:
     """Image quality analysis results"""
-    model_config = ConfigDict(use_enum_values=True)
-    
-    blur_score: float = Field(..., description="Blur detection score")
-    brightness_score: float = Field(..., description="Brightness score")
-    contrast_score: float = Field(..., description="Contrast score")
-    size_score: float = Field(..., description="Size score")
-    overall_score: float = Field(..., description="Overall quality score")
-    is_acceptable: bool = Field(..., description="Whether image is acceptable")
-
-class DamageIndicatorType(str, Enum):
+    blur_score: float  # Blur detection score
+    brightness_score: float  # Brightness score
+    contrast_score: float  # Contrast score
+    size_score: float  # Size score
+    overall_score: float  # Overall quality score
+    is_acceptable: bool  # Whether image is acceptable
+
+class DamageIndicatorType(StrEnum):
     """Damage indicator types"""
     DAMAGE = "damage"
     BROKEN = "broken"
@@ -140,18 +136,16 @@ class DamageIndicatorType(str, Enum):
     WRECKAGE = "wreckage"
     RUINS = "ruins"
 
-class DamageIndicator(BaseModel):
+@dataclass(slots=True, frozen=True)
+class DamageIndicator:
     """Individual damage indicator"""
-    model_config = ConfigDict(use_enum_values=True)
-    
-    type: DamageIndicatorType = Field(..., description="Damage type")
-    confidence: float = Field(..., description="Confidence score")
-    severity_weight: int = Field(..., description="Severity weight")
+    # Descriptions are part of the structured-output schema sent to Gemini
+    type: Annotated[DamageIndicatorType, Field(description="Damage type")]
+    confidence: Annotated[float, Field(description="Confidence score")]
+    severity_weight: Annotated[int, Field(description="Severity weight")]
 
 class DamageAnalysis(BaseModel):
     """Complete damage analysis for an image"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     image_path: str = Field(..., description="Image path/URL")
     has_damage: bool = Field(..., description="Whether damage was detected")
     area: DamageArea = Field(..., description="Damage area")
@@ -176,13 +170,14 @@ class DeduplicationResult(BaseModel):
     cluster_sizes: List[int] = Field(..., description="Size of each cluster")
 
 # Processing Pipeline Types
-class ProcessingStep(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ProcessingStep:
     """Individual processing step result"""
-    step_name: str = Field(..., description="Name of the processing step")
-    duration_ms: float = Field(..., description="Duration in milliseconds")
-    input_count: int = Field(..., description="Number of items input to the step")
-    output_count: int = Field(..., description="Number of items output from the step")
-    errors: List[str] = Field(default_factory=list, description="List of errors encountered during the step")
+    step_name: str  # Name of the processing step
+    duration_ms: float  # Duration in milliseconds
+    input_count: int  # Number of items input to the step
+    output_count: int  # Number of items output from the step
+    errors: List[str] = field(default_factory=list)  # Errors encountered during the step
 
 class ProcessingPipeline(BaseModel):
     """Complete processing pipeline results"""
@@ -211,8 +206,6 @@ class APIGatewayResponse(BaseModel):
 # Logging Types
 class LogContext(BaseModel):
     """Structured logging context"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     correlation_id: str = Field(..., description="Request correlation ID")
     claim_id: Optional[str] = Field(None, description="Claim identifier")
     user_id: Optional[str] = Field(None, description="User identifier")
@@ -226,12 +219,13 @@ class PerformanceMetric(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata")
 
 # AWS Service Types
-class RekognitionLabel(BaseModel):
+@dataclass(slots=True, frozen=True)
+class RekognitionLabel:
     """Amazon Rekognition label"""
-    name: str = Field(..., description="Label name")
-    confidence: float = Field(..., description="Confidence score")
-    instances: List[Dict[str, Any]] = Field(default_factory=list, description="Instances of the label")
-    parents: List[Dict[str, Any]] = Field(default_factory=list, description="Parent labels")
+    name: str  # Label name
+    confidence: float  # Confidence score
+    instances: List[Dict[str, Any]] = field(default_factory=list)  # Instances of the label
+    parents: List[Dict[str, Any]] = field(default_factory=list)  # Parent labels
 
 class RekognitionResponse(BaseModel):
     """Amazon Rekognition API response"""
@@ -240,13 +234,14 @@ class RekognitionResponse(BaseModel):
     image_properties: Optional[Dict[str, Any]] = Field(None, description="Image properties")
 
 # Utility Types
-class ImageDownloadResult(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ImageDownloadResult:
     """Result of image download attempt"""
-    url: str = Field(..., description="Image URL")
-    success: bool = Field(..., description="Whether the download was successful")
-    image_data: Optional[ImageData] = Field(None, description="Downloaded image data")
-    error: Optional[str] = Field(None, description="Error message if download failed")
-    duration_ms: float = Field(default=0.0, description="Duration of the download in milliseconds")
+    url: str  # Image URL
+    success: bool  # Whether the download was successful
+    image_data: Optional[ImageData] = None  # Downloaded image data
+    error: Optional[str] = None  # Error message if download failed
+    duration_ms: float = 0.0  # Duration of the download in milliseconds
 
 class BatchProcessingResult(BaseModel):
     """Result of batch processing operation"""
@@ -264,24 +259,25 @@ DamageResult = List[DamageAnalysis]
 # Processing Result Type
 class ProcessingResult(BaseModel):
     """Result of image processing pipeline"""
-    model_config = ConfigDict(use_enum_values=True)
-    
     total_images: int = Field(..., description="Total images processed")
     analyzed_images: int = Field(..., description="Images successfully analyzed")
     discarded_low_quality: int = Field(..., description="Images discarded")
+    failed_downloads: int = Field(0, description="Images that could not be downloaded")
     clusters: int = Field(..., description="Number of image clusters")
     damage_results: List[DamageAnalysis] = Field(..., description="Damage analysis results")
 
 # Validation Functions
+
+# Accepted image URL schemes, matched at the start of the URL
+IMAGE_URL_PATTERN = re.compile(r'https?://')
+
 def validate_claim_id(claim_id: str) -> bool:
     """Validate claim ID format"""
     return bool(claim_id and len(claim_id) <= 50)
 
 def validate_image_url(url: str) -> bool:
     """Validate image URL"""
-    if not url:
-        return False
-    return url.startswith(('http://', 'https://'))
+    return bool(url and IMAGE_URL_PATTERN.match(url))
 
 def validate_severity(severity: int) -> bool:
     """Validate damage severity"""
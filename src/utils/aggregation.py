@@ -3,14 +3,112 @@ Aggregation utilities for Wind-Damage Photo Aggregator
 Handles damage aggregation, severity calculation, and data gap analysis
 """
 
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
+import numpy as np
 
 from schemas import (
     DamageAnalysis, DamageAreaInfo, DamageArea, DamageSeverity,
-    DamageResult
+    DamageResult, DAMAGE_AREAS, DAMAGE_AREA_CODES
 )
 
+_UNKNOWN_CODE = DAMAGE_AREA_CODES[DamageArea.UNKNOWN]
+
+# Per-result record of the fields aggregation reads
+_RESULT_DTYPE = np.dtype([
+    ('severity', np.int64),
+    ('quality', np.float64),
+    ('confidence', np.float64),
+    ('has_damage', np.bool_),
+    ('area', np.int8),
+])
+
+def results_to_soa(damage_results: DamageResult) -> Dict[str, np.ndarray]:
+    """
+    Convert damage results into parallel per-field arrays (structure of arrays)
+    
+    Args:
+        damage_results: List of damage analysis results
+        
+    Returns:
+        Dict of 'severity', 'quality', 'confidence', 'has_damage' and 'area'
+        (integer area code) arrays, all aligned with damage_results
+    """
+    records = np.fromiter(
+        ((r.severity, r.quality_score, r.confidence, r.has_damage, DAMAGE_AREA_CODES[r.area]) for r in damage_results),
+        dtype=_RESULT_DTYPE,
+        count=len(damage_results)
+    )
+    return {name: np.ascontiguousarray(records[name]) for name in _RESULT_DTYPE.names}
+
+# Columns of the per-area totals produced by area_totals
+(_COUNT, _HIGH_SEVERITY, _WEIGHT, _WEIGHTED_SEVERITY, _SEVERITY,
+ _RECORDS, _QUALITY_SUM, _CONFIDENCE_SUM) = range(8)
+
+def area_totals(area: np.ndarray, severity: np.ndarray, quality: np.ndarray, confidence: np.ndarray,
+                has_damage: np.ndarray, n_areas: int, severity_threshold: Optional[int] = None) -> np.ndarray:
+    """
+    Per-area totals of columnar damage results, one bincount per statistic
+    
+    Args:
+        area: Integer area code of every result
+        severity: Severity of every result
+        quality: Quality score of every result
+        confidence: Confidence of every result
+        has_damage: Damage flag of every result
+        n_areas: Number of area codes
+        severity_threshold: Minimum severity counted as high severity; the
+            high-severity column is left at zero when omitted
+        
+    Returns:
+        (n_areas, 8) array of rows: damaged count, high-severity count,
+        quality weight, quality-weighted severity and severity sum over
+        results with damage, then record count, quality sum and confidence
+        sum over all results
+    """
+    # Results without damage keep their area code but contribute zero weight
+    damaged = has_damage.astype(np.float64)
+    
+    totals = np.zeros((n_areas, _CONFIDENCE_SUM + 1))
+    totals[:, _COUNT] = np.bincount(area, weights=damaged, minlength=n_areas)
+    if severity_threshold is not None:
+        totals[:, _HIGH_SEVERITY] = np.bincount(area, weights=damaged * (severity >= severity_threshold), minlength=n_areas)
+    totals[:, _WEIGHT] = np.bincount(area, weights=damaged * quality, minlength=n_areas)
+    totals[:, _WEIGHTED_SEVERITY] = np.bincount(area, weights=damaged * severity * quality, minlength=n_areas)
+    totals[:, _SEVERITY] = np.bincount(area, weights=damaged * severity, minlength=n_areas)
+    totals[:, _RECORDS] = np.bincount(area, minlength=n_areas)
+    totals[:, _QUALITY_SUM] = np.bincount(area, weights=quality, minlength=n_areas)
+    totals[:, _CONFIDENCE_SUM] = np.bincount(area, weights=confidence, minlength=n_areas)
+    
+    return totals
+
+def _soa_totals(soa: Dict[str, np.ndarray], severity_threshold: Optional[int] = None) -> np.ndarray:
+    """Run area_totals over the columns returned by results_to_soa"""
+    return area_totals(soa['area'], soa['severity'], soa['quality'], soa['confidence'],
+                       soa['has_damage'], len(DAMAGE_AREAS), severity_threshold)
+
+class _ResultSet:
+    """
+    Hashable snapshot of damage results, keyed by every field aggregation reads
+    """
+    
+    __slots__ = ('results', 'key', '_hash')
+    
+    def __init__(self, results: DamageResult):
+        self.results = results
+        self.key = tuple(
+            (r.image_path, r.has_damage, r.area, r.severity, r.quality_score, r.confidence, r.notes)
+            for r in results
+        )
+        self._hash = hash(self.key)
+    
+    def __hash__(self) -> int:
+        return self._hash
+    
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _ResultSet) and self.key == other.key
+
 class DamageAggregator:
     """
     Aggregates damage analysis results by area with business rules
@@ -22,6 +120,12 @@ class DamageAggregator:
         self.severity_threshold = DamageSeverity.MODERATE  # Minimum severity for confirmation
         self.critical_areas = {DamageArea.ROOF, DamageArea.ATTIC, DamageArea.SIDING, DamageArea.GARAGE, DamageArea.WINDOWS, DamageArea.GUTTERS}
         self.max_representative_images = 3
+        
+        # Plain int threshold so the per-result check is a native int comparison
+        self._severity_threshold_value = int(self.severity_threshold)
+        
+        # Aggregations of recently seen result sets
+        self._cached_aggregate = lru_cache(maxsize=128)(self._aggregate)
     
     def aggregate_damage_by_area(self, damage_results: DamageResult) -> List[DamageAreaInfo]:
         """
@@ -42,111 +146,86 @@ class DamageAggregator:
         if not damage_results:
             return []
         
-        # Group results by area
-        area_groups = self._group_by_area(damage_results)
+        # Hand out copies so callers cannot modify the cached entries
+        return [info.model_copy(deep=True) for info in self._cached_aggregate(_ResultSet(damage_results))]
+    
+    def _aggregate(self, result_set: "_ResultSet") -> Tuple[DamageAreaInfo, ...]:
+        """Aggregate a result set by area (memoized by aggregate_damage_by_area)"""
+        results = result_set.results
+        soa = results_to_soa(results)
+        
+        # Per-area totals, one bincount per statistic
+        totals = _soa_totals(soa, self._severity_threshold_value)
+        damaged = np.flatnonzero(soa['has_damage'])
         
         aggregated_areas = []
         
-        for area, results in area_groups.items():
-            if area == DamageArea.UNKNOWN:
+        for code, members in self._group_by_area(soa['area'], damaged).items():
+            if code == _UNKNOWN_CODE:
                 continue  # Skip unknown areas
             
-            area_info = self._process_area(area, results)
+            area_info = self._process_area(DAMAGE_AREAS[code], results, members, soa['quality'][members], totals[code])
             if area_info:
                 aggregated_areas.append(area_info)
         
-        return aggregated_areas
+        return tuple(aggregated_areas)
     
-    def _group_by_area(self, damage_results: DamageResult) -> Dict[DamageArea, List[DamageAnalysis]]:
-        """Group damage results by area"""
-        area_groups: Dict[DamageArea, List[DamageAnalysis]] = defaultdict(list)
-        
-        for result in damage_results:
-            area_groups[result.area].append(result)
-        
-        return dict(area_groups)
+    def _group_by_area(self, area_codes: np.ndarray, damaged: np.ndarray) -> Dict[int, np.ndarray]:
+        """Group indices of results with damage by area code, in order of first appearance"""
+        # Bucket array indexed by area code, filled with one stable sort
+        damaged_codes = area_codes[damaged]
+        bounds = np.cumsum(np.bincount(damaged_codes, minlength=len(DAMAGE_AREAS)))[:-1]
+        buckets = np.split(damaged[np.argsort(damaged_codes, kind='stable')], bounds)
+        
+        # Every area seen in the results, including ones without damage
+        _, first_seen = np.unique(area_codes, return_index=True)
+        return {int(code): buckets[code] for code in area_codes[np.sort(first_seen)].tolist()}
     
-    def _process_area(self, area: DamageArea, results: List[DamageAnalysis]) -> DamageAreaInfo:
-        """Process a single area's damage results"""
-        # Filter results with damage
-        damage_results = [r for r in results if r.has_damage]
-        
-        # Check confirmation rule
-        damage_confirmed = self._check_damage_confirmation(damage_results)
-        
-        # Calculate average severity
-        avg_severity = self._calculate_area_severity(damage_results)
+    def _process_area(self, area: DamageArea, results: DamageResult, members: np.ndarray,
+                      member_quality: np.ndarray, totals: np.ndarray) -> DamageAreaInfo:
+        """Build a single area's damage information from its precomputed totals"""
+        count, high_severity_count, total_weight, weighted_severity, total_severity = totals[:_RECORDS].tolist()
+        count = int(count)
         
-        # Select representative images
-        representative_images = self._select_representative_images(damage_results)
+        # Confirm damage when enough photos show high severity
+        damage_confirmed = high_severity_count >= self.confirmation_threshold
         
-        # Generate notes
-        notes = self._generate_area_notes(area, damage_results)
+        # Weighted average by quality score, falling back to a simple average
+        if total_weight > 0:
+            avg_severity = weighted_severity / total_weight
+        elif count:
+            avg_severity = total_severity / count
+        else:
+            avg_severity = 0.0
+        
+        # Concatenate unique notes, separated by semicolons
+        unique_notes = dict.fromkeys(results[i].notes for i in members.tolist() if results[i].notes)
+        if not count:
+            notes = f"No damage detected in {area}"
+        elif unique_notes:
+            notes = "; ".join(unique_notes)
+        else:
+            notes = f"Damage detected in {area}"
         
         return DamageAreaInfo(
             area=area,
             damage_confirmed=damage_confirmed,
             primary_peril="wind",
-            count=len(damage_results),
+            count=count,
             avg_severity=round(avg_severity, 1),
-            representative_images=representative_images,
+            representative_images=self._select_representative_images(results, members, member_quality),
             notes=notes
         )
     
-    def _check_damage_confirmation(self, damage_results: List[DamageAnalysis]) -> bool:
-        """Check if damage is confirmed based on business rules"""
-        if len(damage_results) < self.confirmation_threshold:
-            return False
-        
-        # Count high severity results
-        high_severity_count = sum(
-            1 for r in damage_results 
-            if r.severity >= self.severity_threshold
-        )
-        
-        return high_severity_count >= self.confirmation_threshold
-    
-    def _calculate_area_severity(self, damage_results: List[DamageAnalysis]) -> float:
-        """Calculate weighted average severity for an area"""
-        if not damage_results:
-            return 0.0
-        
-        # Calculate weighted average by quality score
-        total_weight = sum(r.quality_score for r in damage_results)
-        
-        if total_weight > 0:
-            avg_severity = sum(r.severity * r.quality_score for r in damage_results) / total_weight
-        else:
-            # Fallback to simple average
-            avg_severity = sum(r.severity for r in damage_results) / len(damage_results)
-        
-        return avg_severity
-    
-    def _select_representative_images(self, damage_results: List[DamageAnalysis]) -> List[str]:
+    def _select_representative_images(self, results: DamageResult, members: np.ndarray,
+                                      member_quality: np.ndarray) -> List[str]:
         """Select representative images (highest quality)"""
-        if not damage_results:
+        if not members.size:
             return []
         
-        # Sort by quality score and take top images
-        sorted_results = sorted(damage_results, key=lambda x: x.quality_score, reverse=True)
-        return [r.image_path for r in sorted_results[:self.max_representative_images]]
-    
-    def _generate_area_notes(self, area: DamageArea, damage_results: List[DamageAnalysis]) -> str:
-        """Generate descriptive notes for a damage area"""
-        if not damage_results:
-            return f"No damage detected in {area}"
-        
-        # Aggregate notes from all damage analyses for this area
-        notes_list = []
-        for r in damage_results:
-            if hasattr(r, "notes") and r.notes:
-                notes_list.append(r.notes)
-        if notes_list:
-            # Concatenate unique notes, separated by semicolons
-            unique_notes = list(dict.fromkeys(notes_list))
-            return "; ".join(unique_notes)
-        else:
-            return f"Damage detected in {area}"
+        # Stable sort on descending quality keeps input order among ties
+        top = members[np.argsort(-member_quality, kind='stable')[:self.max_representative_images]]
+        return [results[i].image_path for i in top.tolist()]
     
     def _count_damage_types(self, damage_results: List[DamageAnalysis]) -> Dict[str, int]:
         """Count occurrences of different damage types"""
@@ -161,6 +240,10 @@ class DamageAggregator:
 class SeverityCalculator:
     """Calculates overall damage severity across all areas"""
     
+    def __init__(self):
+        """Initialize calculator with a cache of recent results"""
+        self._cached_severity = lru_cache(maxsize=128)(self._overall_severity)
+    
     def calculate_overall_severity(self, damage_results: DamageResult) -> float:
         """
         Calculate weighted average severity across all areas
@@ -174,23 +257,28 @@ class SeverityCalculator:
         if not damage_results:
             return 0.0
         
-        # Filter results with damage
-        damage_results_filtered = [r for r in damage_results if r.has_damage]
+        return self._cached_severity(_ResultSet(damage_results))
+    
+    def _overall_severity(self, result_set: "_ResultSet") -> float:
+        """Compute overall severity for a result set (memoized by calculate_overall_severity)"""
+        totals = _soa_totals(results_to_soa(result_set.results)).sum(axis=0)
         
-        if not damage_results_filtered:
+        # Only results with damage contribute
+        count = totals[_COUNT]
+        if not count:
             return 0.0
         
         # Calculate weighted average by quality score
-        total_weight = sum(r.quality_score for r in damage_results_filtered)
+        total_weight = totals[_WEIGHT]
         
         if total_weight == 0:
             # Fallback to simple average
-            avg_severity = sum(r.severity for r in damage_results_filtered) / len(damage_results_filtered)
+            avg_severity = totals[_SEVERITY] / count
         else:
             # Weighted average
-            avg_severity = sum(r.severity * r.quality_score for r in damage_results_filtered) / total_weight
+            avg_severity = totals[_WEIGHTED_SEVERITY] / total_weight
         
-        return round(avg_severity, 1)
+        return round(float(avg_severity), 1)
 
 class DataGapAnalyzer:
     """Analyzes data gaps and coverage issues"""
@@ -211,32 +299,25 @@ class DataGapAnalyzer:
         Returns:
             List of data gap descriptions
         """
-        gaps = []
+        # Index the analyzed areas once
+        info_by_area = {info.area: info for info in areas}
         
         # Check for missing critical areas
-        analyzed_areas = {area.area for area in areas}
-        missing_critical = self.critical_areas - analyzed_areas
-        
-        for area in missing_critical:
-            gaps.append(f"No {area.value} photos")
-        
-        # Check for areas with insufficient photos
-        low_confidence_areas = [
-            area for area in areas 
-            if area.count < self.min_photos_per_area
-        ]
-        
-        for area in low_confidence_areas:
-            gaps.append(f"Insufficient {area.area} photos ({area.count} images)")
-        
-        # Check for areas with no damage confirmation
-        unconfirmed_areas = [
-            area for area in areas 
-            if not area.damage_confirmed and area.count > 0
-        ]
-        
-        for area in unconfirmed_areas:
-            gaps.append(f"Unconfirmed {area.area} damage (severity too low)")
+        missing_critical = self.critical_areas - set(info_by_area)
+        gaps = [f"No {area.value} photos" for area in missing_critical]
+        
+        # Check for areas with insufficient photos and with no damage
+        # confirmation in the same pass, keeping the two groups in order
+        insufficient = []
+        unconfirmed = []
+        for area, info in info_by_area.items():
+            if info.count < self.min_photos_per_area:
+                insufficient.append(f"Insufficient {area} photos ({info.count} images)")
+            if not info.damage_confirmed and info.count > 0:
+                unconfirmed.append(f"Unconfirmed {area} damage (severity too low)")
+        
+        gaps.extend(insufficient)
+        gaps.extend(unconfirmed)
         
         # Check for overall coverage
         total_areas = len(areas)
@@ -248,6 +329,10 @@ class DataGapAnalyzer:
 class ConfidenceCalculator:
     """Calculates overall confidence score"""
     
+    def __init__(self):
+        """Initialize calculator with a cache of recent results"""
+        self._cached_confidence = lru_cache(maxsize=128)(self._confidence)
+    
     def calculate_confidence(self, damage_results: DamageResult) -> float:
         """
         Calculate overall confidence score based on multiple factors
@@ -261,15 +346,24 @@ class ConfidenceCalculator:
         if not damage_results:
             return 0.0
         
+        return self._cached_confidence(_ResultSet(damage_results))
+    
+    def _confidence(self, result_set: "_ResultSet") -> float:
+        """Compute confidence for a result set (memoized by calculate_confidence)"""
+        totals = _soa_totals(results_to_soa(result_set.results))
+        overall = totals.sum(axis=0)
+        
         # Calculate confidence factors
-        total_images = len(damage_results)
-        damage_images = len([r for r in damage_results if r.has_damage])
+        total_images = int(overall[_RECORDS])
+        damage_images = int(overall[_COUNT])
         
         # Quality factor (average quality score)
-        avg_quality = sum(r.quality_score for r in damage_results) / total_images
+        avg_quality = float(overall[_QUALITY_SUM] / total_images)
         
         # Coverage factor (how many areas are covered)
-        unique_areas = len(set(r.area for r in damage_results if r.area != DamageArea.UNKNOWN))
+        covered = totals[:, _RECORDS] > 0
+        covered[_UNKNOWN_CODE] = False
+        unique_areas = int(np.count_nonzero(covered))
         coverage_factor = min(1.0, unique_areas / 3.0)  # Normalize to 3 areas max
         
         # Consistency factor (how consistent are the results)
@@ -279,7 +373,7 @@ class ConfidenceCalculator:
             consistency_factor = 0.5  # Neutral if no damage detected
         
         # Average confidence from individual analyses
-        avg_confidence = sum(r.confidence for r in damage_results) / total_images
+        avg_confidence = float(overall[_CONFIDENCE_SUM] / total_images)
         
         # Weighted combination
         final_confidence = (
@@ -6,11 +6,30 @@ Handles timeouts, retries, and error handling
 import asyncio
 import aiohttp
 import logging
-from typing import List, Optional
+import random
+import re
+from typing import AsyncIterator, List, Optional
 from schemas import ImageTuple, BatchProcessingResult
 
 logger = logging.getLogger(__name__)
 
+# Common image extension at the end of the URL path (before any query or fragment)
+_IMAGE_EXTENSION_RE = re.compile(r'\.(?:jpe?g|png|gif|bmp|webp)(?:$|[?#])', re.IGNORECASE)
+
+class RetryableHTTPError(Exception):
+    """HTTP error the origin asked us to retry, with its optional Retry-After delay"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a delta-seconds Retry-After header (HTTP-date values are ignored)"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
 class ImageFetcher:
     """
     Fetches images from URLs concurrently with error handling
@@ -20,70 +39,73 @@ class ImageFetcher:
         """Initialize fetcher with configuration"""
         self.timeout = 30  # seconds
         self.max_retries = 3
+        self.base_backoff = 0.25  # seconds, doubled on every retry
+        self.max_backoff = 8.0  # seconds, also caps Retry-After
         self.max_concurrent = 10  # max concurrent downloads
         self.max_size = 10 * 1024 * 1024  # 10MB max file size
         
-    async def fetch_images(self, urls: List[str], correlation_id: str) -> List[ImageTuple]:
+    async def fetch_images(self, urls: List[str], correlation_id: str) -> AsyncIterator[ImageTuple]:
         """
-        Fetch images from URLs synchronously (wrapper for async)
+        Fetch images from URLs asynchronously, yielding each one as it completes
         
-        Args:
-            urls: List of image URLs
-            correlation_id: Request correlation ID for logging
-            
-        Returns:
-            List of (url, image_bytes) tuples
-        """
-        return await self._fetch_images_async(urls, correlation_id)
-    
-    async def _fetch_images_async(self, urls: List[str], correlation_id: str) -> List[ImageTuple]:
-        """
-        Fetch images from URLs asynchronously
+        Downloads are yielded in completion order, not URL order, so the next
+        stage can start on the first images while slower ones are in flight.
         
         Args:
             urls: List of image URLs
             correlation_id: Request correlation ID for logging
             
-        Returns:
-            List of (url, image_bytes) tuples
+        Yields:
+            (url, image_bytes) tuples of successful downloads
         """
         logger.info(f"Fetching {len(urls)} images", extra={"correlation_id": correlation_id})
         
         # Create semaphore to limit concurrent downloads
         semaphore = asyncio.Semaphore(self.max_concurrent)
         
-        # Create tasks for all URLs
-        tasks = [
-            self._fetch_single_image(url, semaphore, correlation_id)
-            for url in urls
-        ]
-        
-        # Wait for all tasks to complete
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Filter out failed downloads
-        successful_downloads = []
-        failed_count = 0
-        
-        for result in results:
-            if isinstance(result, Exception):
-                failed_count += 1
-                logger.warning(f"Failed to download image: {str(result)}", 
-                             extra={"correlation_id": correlation_id})
-            elif result is not None:
-                successful_downloads.append(result)
-        
-        logger.info(f"Downloaded {len(successful_downloads)}/{len(urls)} images successfully", 
+        # One pooled session for the whole batch so connections, TLS sessions
+        # and DNS lookups are reused across downloads
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrent, ttl_dns_cache=300)
+        
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            # Create tasks for all URLs
+            tasks = [
+                asyncio.ensure_future(self._fetch_single_image(session, url, semaphore, correlation_id))
+                for url in urls
+            ]
+            
+            # Yield downloads as they finish, skipping failed ones
+            downloaded_count = 0
+            failed_count = 0
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        result = await next_done
+                    except Exception as e:
+                        failed_count += 1
+                        logger.warning(f"Failed to download image: {str(e)}", 
+                                     extra={"correlation_id": correlation_id})
+                        continue
+                    
+                    if result is not None:
+                        downloaded_count += 1
+                        yield result
+            finally:
+                # Stop outstanding downloads if the consumer exits early
+                for task in tasks:
+                    task.cancel()
+        
+        logger.info(f"Downloaded {downloaded_count}/{len(urls)} images successfully", 
                    extra={"correlation_id": correlation_id, "failed": failed_count})
-        
-        return successful_downloads
     
-    async def _fetch_single_image(self, url: str, semaphore: asyncio.Semaphore, 
-                                 correlation_id: str) -> Optional[ImageTuple]:
+    async def _fetch_single_image(self, session: aiohttp.ClientSession, url: str,
+                                 semaphore: asyncio.Semaphore, correlation_id: str) -> Optional[ImageTuple]:
         """
         Fetch a single image with retry logic
         
         Args:
+            session: Shared HTTP session
             url: Image URL
             semaphore: Semaphore for limiting concurrent downloads
             correlation_id: Request correlation ID for logging
@@ -94,7 +116,7 @@ class ImageFetcher:
         async with semaphore:
             for attempt in range(self.max_retries):
                 try:
-                    return await self._download_image(url, correlation_id)
+                    return await self._download_image(session, url, correlation_id)
                 except Exception as e:
                     if attempt == self.max_retries - 1:
                         logger.error(f"Failed to download {url} after {self.max_retries} attempts: {str(e)}", 
@@ -103,45 +125,76 @@ class ImageFetcher:
                     else:
                         logger.warning(f"Attempt {attempt + 1} failed for {url}: {str(e)}", 
                                      extra={"correlation_id": correlation_id})
-                        await asyncio.sleep(1)  # Brief delay before retry
+                        await asyncio.sleep(self._retry_delay(attempt, e))
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Seconds to wait before the next attempt
+        
+        Honors the origin's Retry-After when given, otherwise uses exponential
+        backoff with jitter so concurrent downloads don't retry in lockstep.
+        
+        Args:
+            attempt: Zero-based index of the attempt that failed
+            error: Exception raised by that attempt
+            
+        Returns:
+            Delay in seconds
+        """
+        if isinstance(error, RetryableHTTPError) and error.retry_after is not None:
+            return min(self.max_backoff, error.retry_after)
+        
+        return min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
     
-    async def _download_image(self, url: str, correlation_id: str) -> ImageTuple:
+    async def _download_image(self, session: aiohttp.ClientSession, url: str,
+                              correlation_id: str) -> ImageTuple:
         """
         Download a single image
         
         Args:
+            session: Shared HTTP session
             url: Image URL
             correlation_id: Request correlation ID for logging
             
         Returns:
             Tuple of (url, image_bytes)
         """
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
-        
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise Exception(f"HTTP {response.status}: {response.reason}")
-                
-                # Check content type
-                content_type = response.headers.get('content-type', '').lower()
-                if not content_type.startswith('image/'):
-                    raise Exception(f"Invalid content type: {content_type}")
-                
-                # Read image data with size limit
-                image_data = bytearray()
-                async for chunk in response.content.iter_chunked(8192):
-                    image_data.extend(chunk)
-                    if len(image_data) > self.max_size:
-                        raise Exception(f"Image too large: {len(image_data)} bytes")
-                
-                if not image_data:
-                    raise Exception("Empty image data")
-                
-                logger.debug(f"Successfully downloaded {url} ({len(image_data)} bytes)", 
-                           extra={"correlation_id": correlation_id})
-                
-                return (url, bytes(image_data))
+        async with session.get(url) as response:
+            if response.status in (429, 503):
+                raise RetryableHTTPError(f"HTTP {response.status}: {response.reason}",
+                                         _parse_retry_after(response.headers.get('Retry-After')))
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}: {response.reason}")
+            
+            # Check content type
+            content_type = response.headers.get('content-type', '').lower()
+            if not content_type.startswith('image/'):
+                raise Exception(f"Invalid content type: {content_type}")
+            
+            # Reject oversized images from the headers alone
+            content_length = response.content_length
+            if content_length is not None and content_length > self.max_size:
+                raise Exception(f"Image too large: {content_length} bytes")
+            
+            # Read image data with size limit into a buffer preallocated to the
+            # advertised length; slice assignment grows it if the body is longer
+            image_data = bytearray(content_length or 0)
+            size = 0
+            async for chunk in response.content.iter_chunked(65536):
+                end = size + len(chunk)
+                if end > self.max_size:
+                    raise Exception(f"Image too large: {end} bytes")
+                image_data[size:end] = chunk
+                size = end
+            del image_data[size:]
+            
+            if not image_data:
+                raise Exception("Empty image data")
+            
+            logger.debug(f"Successfully downloaded {url} ({size} bytes)", 
+                       extra={"correlation_id": correlation_id})
+            
+            return (url, bytes(image_data))
     
     def validate_url(self, url: str) -> bool:
         """
@@ -153,14 +206,7 @@ class ImageFetcher:
         Returns:
             True if URL appears to be an image
         """
-        if not url:
-            return False
-        
-        # Check for common image extensions
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-        url_lower = url.lower()
-        
-        return any(ext in url_lower for ext in image_extensions)
+        return bool(url and _IMAGE_EXTENSION_RE.search(url))
     
     def get_download_stats(self, urls: List[str], results: List[ImageTuple]) -> BatchProcessingResult:
         """
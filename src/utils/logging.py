@@ -3,20 +3,40 @@ Logging utility for structured JSON logging with correlation IDs
 """
 
 import logging
-import json
+import orjson
 import sys
-from datetime import datetime, timezone
+import time
 from schemas import LogContext, PerformanceMetric
 
+# LogRecord attributes that are not copied into the JSON entry as extra fields
+_EXCLUDED_KEYS = frozenset({
+    'name', 'msg', 'args', 'levelname', 'levelno', 'pathname',
+    'filename', 'module', 'lineno', 'funcName', 'created',
+    'msecs', 'relativeCreated', 'thread', 'threadName',
+    'processName', 'process', 'getMessage', 'exc_info',
+    'exc_text', 'stack_info', 'correlation_id', 'claim_id'
+})
+
+# Level numbers by name, in both the upper and lower case spellings callers use
+_LOG_LEVELS = {
+    **logging.getLevelNamesMapping(),
+    **{name.lower(): value for name, value in logging.getLevelNamesMapping().items()}
+}
+
 class JSONFormatter(logging.Formatter):
     """
     Custom JSON formatter for structured logging
     """
     
+    # Timestamps come from record.created, rendered as UTC ISO 8601 with milliseconds
+    converter = time.gmtime
+    default_time_format = '%Y-%m-%dT%H:%M:%S'
+    default_msec_format = '%s.%03dZ'
+    
     def format(self, record):
         """Format log record as JSON"""
         log_entry = {
-            'timestamp': datetime.now(timezone.utc).isoformat() + 'Z',
+            'timestamp': self.formatTime(record),
             'level': record.levelname,
             'message': record.getMessage(),
             'module': record.module,
@@ -34,18 +54,15 @@ class JSONFormatter(logging.Formatter):
         
         # Add any extra fields
         for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'levelname', 'levelno', 'pathname', 
-                          'filename', 'module', 'lineno', 'funcName', 'created', 
-                          'msecs', 'relativeCreated', 'thread', 'threadName', 
-                          'processName', 'process', 'getMessage', 'exc_info', 
-                          'exc_text', 'stack_info', 'correlation_id', 'claim_id']:
+            if key not in _EXCLUDED_KEYS:
                 log_entry[key] = value
         
         # Add exception info if present
         if record.exc_info:
             log_entry['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_entry)
+        # Compact output; values orjson can't encode natively fall back to str()
+        return orjson.dumps(log_entry, default=str).decode()
 
 def setup_logging(level: str = 'INFO') -> logging.Logger:
     """
@@ -90,6 +107,13 @@ def log_with_context(logger: logging.Logger, level: str, message: str,
         context: LogContext with correlation and claim IDs
         **kwargs: Additional context fields
     """
+    # Skip building the record entirely when the level is disabled
+    levelno = _LOG_LEVELS.get(level)
+    if levelno is None:
+        levelno = _LOG_LEVELS[level.upper()]
+    if not logger.isEnabledFor(levelno):
+        return
+    
     extra = kwargs.copy()
     extra['correlation_id'] = context.correlation_id
     if context.claim_id:
@@ -99,8 +123,7 @@ def log_with_context(logger: logging.Logger, level: str, message: str,
     if context.request_id:
         extra['request_id'] = context.request_id
     
-    log_method = getattr(logger, level.lower())
-    log_method(message, extra=extra)
+    logger.log(levelno, message, extra=extra)
 
 def log_request_start(logger: logging.Logger, context: LogContext):
     """